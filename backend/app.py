@@ -1,116 +1,363 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_from_directory, url_for
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 import os
 import uuid
-from PIL import Image
 import time
-import json
+import orjson
+import sqlite3
+import cv2
 import numpy as np
 from typing import Optional
-from models.mask_rcnn import run_mask_rcnn
+from models.mask_rcnn import run_mask_rcnn_all, setup_detectron2
 from models.astar_refinement import refine_mask
-from utils.image_utils import save_image, image_to_base64
-from utils.metrics import compute_metrics
+from utils.edges import compute_edge_map
+from utils.image_utils import (
+    MASK_PNG_PARAMS,
+    decode_image,
+    decode_image_bytes,
+    image_to_base64,
+    mask_to_base64,
+)
+from utils.metrics import compute_mask_overlap
+from utils.metrics_fused import compute_metrics_pair
+import concurrent.futures
+import queue
 import threading
 import logging
+from collections import OrderedDict
 
-app = Flask(__name__)
+
+class ORJSONProvider(JSONProvider):
+    """JSON provider backed by orjson.
+
+    orjson serializes several times faster than stdlib json and handles
+    numpy scalars natively, so metric values need no manual float() casts.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand the orjson bytes straight to the response instead of
+        # decoding to str only for Flask to re-encode them
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY),
+            mimetype="application/json",
+        )
+
+
+class ORJSONFlask(Flask):
+    json_provider_class = ORJSONProvider
+
+
+app = ORJSONFlask(__name__)
 CORS(app)
 
+# Werkzeug spools larger uploads to disk instead of RAM; reject anything
+# unreasonably big before it is read
+app.config["MAX_CONTENT_LENGTH"] = 32 * 1024 * 1024
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-UPLOAD_FOLDER = "uploads"
-RESULT_FOLDER = "results"
+# Anchor storage to this file, not the process CWD: send_from_directory
+# resolves relative paths against app.root_path, so writes and serves
+# must agree on the same absolute location
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
+RESULT_FOLDER = os.path.join(BASE_DIR, "results")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULT_FOLDER, exist_ok=True)
 
+# Warm the predictor at import so the first upload doesn't pay model
+# construction; with no preloading master and no dev reloader, every
+# process that imports the app is a serving process
+setup_detectron2()
+
 # Thread lock for file operations
 file_lock = threading.Lock()
 
+# Single SQLite store for per-instance results; WAL mode allows readers to
+# proceed while the background thread writes, and a point lookup replaces
+# the old stat + open + json.load per poll
+_results_db = None
+_results_db_pid = None
+
+
+def _get_results_db() -> sqlite3.Connection:
+    """Return this process's SQLite connection, opening it on first use.
+
+    A connection must never cross a fork, so it is opened lazily and
+    keyed by pid instead of at import. Within a process file_lock
+    serializes access (every caller holds it); across processes WAL plus
+    the busy timeout let concurrent workers write safely.
+    """
+    global _results_db, _results_db_pid
+    if _results_db is None or _results_db_pid != os.getpid():
+        conn = sqlite3.connect(
+            "results.db", check_same_thread=False, isolation_level=None
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                image_id TEXT,
+                idx INTEGER,
+                metrics TEXT,
+                orig_path TEXT,
+                custom_path TEXT,
+                n INTEGER,
+                PRIMARY KEY (image_id, idx)
+            )"""
+        )
+        _results_db = conn
+        _results_db_pid = os.getpid()
+    return _results_db
+
+
+def save_result_record(
+    image_id: str,
+    index: int,
+    metrics: dict,
+    original_mask_path: str,
+    custom_mask_path: str,
+    total_instances: int,
+):
+    """Persist an instance's metrics and mask paths to the results database."""
+    with file_lock:
+        _get_results_db().execute(
+            "INSERT OR REPLACE INTO results "
+            "(image_id, idx, metrics, orig_path, custom_path, n) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                image_id,
+                index,
+                orjson.dumps(
+                    metrics, option=orjson.OPT_SERIALIZE_NUMPY
+                ).decode("utf-8"),
+                original_mask_path,
+                custom_mask_path,
+                total_instances,
+            ),
+        )
 
-def compute_metrics_thread(
-    mask: np.ndarray, image: np.ndarray, result_list: list, index: int
+
+def load_result_record(image_id: str, index: int) -> Optional[dict]:
+    """Fetch an instance's saved metrics and mask paths, or None if absent."""
+    with file_lock:
+        row = _get_results_db().execute(
+            "SELECT metrics, orig_path, custom_path, n FROM results "
+            "WHERE image_id = ? AND idx = ?",
+            (image_id, index),
+        ).fetchone()
+    if row is None:
+        return None
+    return {
+        "metrics": orjson.loads(row[0]),
+        "original_mask_path": row[1],
+        "custom_mask_path": row[2],
+        "total_instances": row[3],
+    }
+
+
+# In-memory LRU cache of per-image results keyed by image_id. Disk files
+# remain the durable record; the cache lets /results answer from RAM
+# without re-running the detector or touching the filesystem.
+IMAGE_CACHE_MAX = 64
+image_cache = OrderedDict()
+image_cache_lock = threading.Lock()
+
+
+def cache_image(
+    image_id: str,
+    image: np.ndarray,
+    masks: list,
+    total_instances: int,
+    edge_map: np.ndarray,
 ):
-    """Wrapper to compute metrics in a thread and store result in result_list."""
-    try:
-        result_list[index] = compute_metrics(mask, image)
-    except Exception as e:
-        logger.error(f"Error computing metrics in thread: {str(e)}")
-        result_list[index] = {
-            "edge_alignment_score": 0.0,
-            "region_homogeneity_score": 0.0,
+    """Store the decoded image, detected masks, and edge map, evicting oldest entries."""
+    with image_cache_lock:
+        image_cache[image_id] = {
+            "image": image,
+            "masks": masks,
+            "custom_masks": {},
+            "metrics": {},
+            "b64": {},
+            "edge_map": edge_map,
+            "total_instances": total_instances,
         }
+        image_cache.move_to_end(image_id)
+        while len(image_cache) > IMAGE_CACHE_MAX:
+            image_cache.popitem(last=False)
+
+
+def cache_result(image_id: str, index: int, custom_mask: np.ndarray, metrics: dict):
+    """Attach a refined mask and its metrics to the cached image entry."""
+    with image_cache_lock:
+        entry = image_cache.get(image_id)
+        if entry is not None:
+            entry["custom_masks"][index] = custom_mask
+            entry["metrics"][index] = metrics
+
+
+def get_cached_entry(image_id: str) -> Optional[dict]:
+    """Look up an image's cache entry, refreshing its LRU position."""
+    with image_cache_lock:
+        entry = image_cache.get(image_id)
+        if entry is not None:
+            image_cache.move_to_end(image_id)
+        return entry
+
+
+def _u8(mask: np.ndarray) -> np.ndarray:
+    """Normalize a mask to a contiguous uint8 {0, 255} array.
+
+    Called once where masks are produced so every consumer (PNG encode,
+    metrics, base64) gets the layout it wants without re-converting.
+    """
+    if mask.dtype == bool:
+        return mask.astype(np.uint8) * 255
+    return np.ascontiguousarray(mask, dtype=np.uint8)
+
+
+# Bounded queue of persistence jobs drained by a single per-process writer
+# thread, so compute threads hand off disk I/O instead of blocking on it.
+# Jobs are zero-argument callables, letting a result's PNG writes and its
+# database record land as one ordered unit.
+write_queue = queue.Queue(maxsize=256)
+
+_writer_thread = None
+_writer_thread_lock = threading.Lock()
+
+
+def _writer_loop():
+    """Drain the write queue, running each queued persistence job."""
+    while True:
+        job = write_queue.get()
+        try:
+            job()
+        except Exception as e:
+            logger.error(f"Error in background write: {str(e)}")
+        finally:
+            write_queue.task_done()
+
+
+def _enqueue_write(job):
+    """Queue a persistence job, starting the writer thread on first use.
+
+    The thread is started lazily per process rather than at import: a
+    thread started in a preloading WSGI master would not survive the fork
+    into workers, leaving the queue without a consumer.
+    """
+    global _writer_thread
+    if _writer_thread is None or not _writer_thread.is_alive():
+        with _writer_thread_lock:
+            if _writer_thread is None or not _writer_thread.is_alive():
+                _writer_thread = threading.Thread(target=_writer_loop, daemon=True)
+                _writer_thread.start()
+    write_queue.put(job)
+
+
+def _encode_mask_png(mask: np.ndarray) -> bytes:
+    """Encode a mask as PNG bytes with OpenCV.
+
+    OpenCV's PNG encoder is much faster than PIL's.
+    """
+    ok, buf = cv2.imencode(".png", mask, MASK_PNG_PARAMS)
+    if not ok:
+        raise ValueError("Could not encode mask")
+    return buf.tobytes()
+
+
+def refine_and_save(
+    original_mask: np.ndarray,
+    image: np.ndarray,
+    image_id: str,
+    index: int,
+    total_instances: int,
+    edge_map: Optional[np.ndarray] = None,
+) -> dict:
+    """Refine a detected mask, compute its metrics, and save the results.
+
+    The edge map depends only on the image, so callers compute it once per
+    request and share it across refinement and both metric scores.
+    Returns a dict with the refined mask, its metrics, and the saved paths,
+    so request handlers can respond from the in-memory arrays.
+    """
+    start_time = time.time()
+    custom_mask = _u8(refine_mask(original_mask, image, edge_map=edge_map))
+
+    # Compute metrics for both masks in one fused pass over the image
+    original_metrics, custom_metrics = compute_metrics_pair(
+        original_mask, custom_mask, image, edge_map
+    )
+    overlap = compute_mask_overlap(original_mask, custom_mask)
+
+    metrics = {
+        "original_edge_alignment_score": original_metrics["edge_alignment_score"],
+        "original_region_homogeneity_score": original_metrics[
+            "region_homogeneity_score"
+        ],
+        "custom_edge_alignment_score": custom_metrics["edge_alignment_score"],
+        "custom_region_homogeneity_score": custom_metrics["region_homogeneity_score"],
+        "mask_iou": overlap["iou"],
+        "mask_dice": overlap["dice"],
+        "processing_time": time.time() - start_time,
+    }
+
+    original_mask_path = os.path.join(RESULT_FOLDER, f"{image_id}_{index}_original.png")
+    custom_mask_path = os.path.join(RESULT_FOLDER, f"{image_id}_{index}_custom.png")
+
+    # Encode here, persist in the writer thread. Files go down before the
+    # record so a poll from another process only sees the database row
+    # once the PNGs it points at exist.
+    original_png = _encode_mask_png(original_mask)
+    custom_png = _encode_mask_png(custom_mask)
+
+    def _persist():
+        with open(original_mask_path, "wb") as f:
+            f.write(original_png)
+        with open(custom_mask_path, "wb") as f:
+            f.write(custom_png)
+        save_result_record(
+            image_id,
+            index,
+            metrics,
+            original_mask_path,
+            custom_mask_path,
+            total_instances,
+        )
+
+    _enqueue_write(_persist)
+    cache_result(image_id, index, custom_mask, metrics)
 
+    return {
+        "custom_mask": custom_mask,
+        "metrics": metrics,
+        "original_mask_path": original_mask_path,
+        "custom_mask_path": custom_mask_path,
+    }
 
-def process_instance(
-    image_path: str, image_id: str, index: int, total_instances: int
+
+def refine_and_save_logged(
+    original_mask: np.ndarray,
+    image: np.ndarray,
+    image_id: str,
+    index: int,
+    total_instances: int,
+    edge_map: Optional[np.ndarray] = None,
 ) -> bool:
-    """Process a single instance and save results."""
+    """refine_and_save wrapper that logs failures, for background workers."""
     try:
-        start_time = time.time()
-        original_mask, _ = run_mask_rcnn(image_path, index)
-        if original_mask is None:
-            return False
-
-        custom_mask = refine_mask(original_mask, image_path)
-        image = Image.open(image_path).convert("RGB")
-        image_np = np.array(image)[:, :, ::-1]  # Convert RGB to BGR for OpenCV
-
-        # Compute metrics for both masks in parallel
-        result_list = [None, None]  # [original_metrics, custom_metrics]
-        threads = [
-            threading.Thread(
-                target=compute_metrics_thread,
-                args=(original_mask, image_np, result_list, 0),
-            ),
-            threading.Thread(
-                target=compute_metrics_thread,
-                args=(custom_mask, image_np, result_list, 1),
-            ),
-        ]
-
-        # Start and join threads
-        for t in threads:
-            t.start()
-        for t in threads:
-            t.join()
-
-        original_metrics = result_list[0]
-        custom_metrics = result_list[1]
-
-        metrics = {
-            "original_edge_alignment_score": original_metrics["edge_alignment_score"],
-            "original_region_homogeneity_score": original_metrics[
-                "region_homogeneity_score"
-            ],
-            "custom_edge_alignment_score": custom_metrics["edge_alignment_score"],
-            "custom_region_homogeneity_score": custom_metrics[
-                "region_homogeneity_score"
-            ],
-            "processing_time": time.time() - start_time,
-        }
-
-        original_mask_path = os.path.join(
-            RESULT_FOLDER, f"{image_id}_{index}_original.png"
+        refine_and_save(
+            original_mask, image, image_id, index, total_instances, edge_map
         )
-        custom_mask_path = os.path.join(RESULT_FOLDER, f"{image_id}_{index}_custom.png")
-        metrics_path = os.path.join(RESULT_FOLDER, f"{image_id}_{index}_metrics.json")
-
-        with file_lock:
-            Image.fromarray(original_mask).save(original_mask_path)
-            Image.fromarray(custom_mask).save(custom_mask_path)
-            with open(metrics_path, "w") as f:
-                json.dump(
-                    {
-                        "metrics": metrics,
-                        "original_mask_path": original_mask_path,
-                        "custom_mask_path": custom_mask_path,
-                        "total_instances": total_instances,
-                    },
-                    f,
-                )
         return True
     except Exception as e:
         logger.error(
@@ -119,14 +366,53 @@ def process_instance(
         return False
 
 
+# Persistent in-process task queue for background refinement. Submitting
+# returns immediately, so request handlers never block on worker startup
+# or shutdown. refine_mask (OpenCV), the numpy reductions in
+# compute_metrics, and cv2.imencode all release the GIL, so instances
+# refine in parallel
+background_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=os.cpu_count(), thread_name_prefix="refine"
+)
+
+
 def background_process_all_instances(
-    image_path: str, image_id: str, total_instances: int, skip_index: int
+    masks: list,
+    image: np.ndarray,
+    image_id: str,
+    total_instances: int,
+    skip_index: int,
+    edge_map: Optional[np.ndarray] = None,
 ):
-    """Compute masks for all instances in the background, skipping the provided index."""
+    """Queue background refinement of all instances except the provided index."""
     for index in range(total_instances):
         if index == skip_index:
             continue
-        process_instance(image_path, image_id, index, total_instances)
+        background_executor.submit(
+            refine_and_save_logged,
+            masks[index],
+            image,
+            image_id,
+            index,
+            total_instances,
+            edge_map,
+        )
+
+
+@app.route("/masks/<fname>", methods=["GET"])
+def get_mask_file(fname: str):
+    """Serve saved mask PNGs as static files.
+
+    send_from_directory streams via sendfile(2) where the WSGI server
+    supports it, and conditional=True enables ETag/If-Modified-Since so
+    repeated polls skip re-transmission.
+    """
+    return send_from_directory(RESULT_FOLDER, fname, conditional=True)
+
+
+def mask_url(mask_path: str) -> str:
+    """Return the /masks URL for a saved mask file."""
+    return url_for("get_mask_file", fname=os.path.basename(mask_path))
 
 
 @app.route("/upload", methods=["POST"])
@@ -145,14 +431,25 @@ def upload_image():
 
     image_id = str(uuid.uuid4())
     image_path = os.path.join(UPLOAD_FOLDER, f"{image_id}.png")
-    save_image(file, image_path)
 
     try:
-        start_time = time.time()
-        # Run Mask R-CNN for the specified index
-        original_mask, total_instances = run_mask_rcnn(image_path, index)
-
-        if original_mask is None:
+        # Decode straight from the request body; the same array is shared
+        # by inference, refinement, metrics, and the background workers
+        upload_bytes = file.read()
+        image_np = decode_image_bytes(upload_bytes)
+        if image_np is None:
+            return jsonify({"error": "Could not decode image"}), 400
+
+        # Persist the raw bytes before responding: a /results poll landing
+        # on another worker must be able to re-derive from disk, so the
+        # image file has to exist by the time the client learns the id
+        with open(image_path, "wb") as f:
+            f.write(upload_bytes)
+
+        # Run Mask R-CNN once for all instances
+        masks, total_instances = run_mask_rcnn_all(image_np)
+
+        if index < 0 or index >= total_instances:
             return (
                 jsonify(
                     {
@@ -163,80 +460,31 @@ def upload_image():
                 404,
             )
 
-        # Run A* refinement
-        custom_mask = refine_mask(original_mask, image_path)
+        original_mask = masks[index]
 
-        # Load image for metrics
-        image = Image.open(image_path).convert("RGB")
-        image_np = np.array(image)[:, :, ::-1]  # Convert RGB to BGR for OpenCV
+        # One edge map per request, shared by refinement and metrics for
+        # every instance of this image
+        edge_map = compute_edge_map(image_np)
+        cache_image(image_id, image_np, masks, total_instances, edge_map)
 
-        # Compute metrics for both masks in parallel
-        result_list = [None, None]  # [original_metrics, custom_metrics]
-        threads = [
-            threading.Thread(
-                target=compute_metrics_thread,
-                args=(original_mask, image_np, result_list, 0),
-            ),
-            threading.Thread(
-                target=compute_metrics_thread,
-                args=(custom_mask, image_np, result_list, 1),
-            ),
-        ]
-
-        # Start and join threads
-        for t in threads:
-            t.start()
-        for t in threads:
-            t.join()
-
-        original_metrics = result_list[0]
-        custom_metrics = result_list[1]
-
-        metrics = {
-            "original_edge_alignment_score": original_metrics["edge_alignment_score"],
-            "original_region_homogeneity_score": original_metrics[
-                "region_homogeneity_score"
-            ],
-            "custom_edge_alignment_score": custom_metrics["edge_alignment_score"],
-            "custom_region_homogeneity_score": custom_metrics[
-                "region_homogeneity_score"
-            ],
-            "processing_time": time.time() - start_time,
-        }
+        result = refine_and_save(
+            original_mask, image_np, image_id, index, total_instances, edge_map
+        )
 
-        # Save results
-        original_mask_path = os.path.join(
-            RESULT_FOLDER, f"{image_id}_{index}_original.png"
+        # Queue the remaining detected masks for background refinement,
+        # reusing the single forward pass above; submission is non-blocking
+        background_process_all_instances(
+            masks, image_np, image_id, total_instances, index, edge_map
         )
-        custom_mask_path = os.path.join(RESULT_FOLDER, f"{image_id}_{index}_custom.png")
-        metrics_path = os.path.join(RESULT_FOLDER, f"{image_id}_{index}_metrics.json")
-
-        with file_lock:
-            Image.fromarray(original_mask).save(original_mask_path)
-            Image.fromarray(custom_mask).save(custom_mask_path)
-            with open(metrics_path, "w") as f:
-                json.dump(
-                    {
-                        "metrics": metrics,
-                        "original_mask_path": original_mask_path,
-                        "custom_mask_path": custom_mask_path,
-                        "total_instances": total_instances,
-                    },
-                    f,
-                )
-
-        # Start background processing for all other indices
-        threading.Thread(
-            target=background_process_all_instances,
-            args=(image_path, image_id, total_instances, index),
-            daemon=True,
-        ).start()
-
-        # Prepare response
+
+        # Prepare response straight from the in-memory arrays; no need to
+        # re-read and re-decode the PNGs that were just written
         results = {
-            "original_mask": image_to_base64(original_mask_path),
-            "custom_mask": image_to_base64(custom_mask_path),
-            "metrics": metrics,
+            "original_mask": mask_to_base64(original_mask),
+            "custom_mask": mask_to_base64(result["custom_mask"]),
+            "original_mask_url": mask_url(result["original_mask_path"]),
+            "custom_mask_url": mask_url(result["custom_mask_path"]),
+            "metrics": result["metrics"],
             "total_instances": total_instances,
         }
 
@@ -247,15 +495,38 @@ def upload_image():
 
 @app.route("/results/<image_id>/<int:index>", methods=["GET"])
 def get_results(image_id: str, index: int):
-    metrics_path = os.path.join(RESULT_FOLDER, f"{image_id}_{index}_metrics.json")
     image_path = os.path.join(UPLOAD_FOLDER, f"{image_id}.png")
 
-    # If metrics file exists, load and return results
-    if os.path.exists(metrics_path):
-        try:
-            with open(metrics_path, "r") as f:
-                data = json.load(f)
+    # Serve directly from RAM when the instance has already been processed
+    entry = get_cached_entry(image_id)
+    if entry is not None and index in entry["metrics"]:
+        # Encode each mask pair once; repeated polls reuse the cached
+        # base64 strings instead of re-running the PNG encoder
+        b64_pair = entry["b64"].get(index)
+        if b64_pair is None:
+            b64_pair = (
+                mask_to_base64(entry["masks"][index]),
+                mask_to_base64(entry["custom_masks"][index]),
+            )
+            entry["b64"][index] = b64_pair
+        return (
+            jsonify(
+                {
+                    "original_mask": b64_pair[0],
+                    "custom_mask": b64_pair[1],
+                    "original_mask_url": mask_url(f"{image_id}_{index}_original.png"),
+                    "custom_mask_url": mask_url(f"{image_id}_{index}_custom.png"),
+                    "metrics": entry["metrics"][index],
+                    "total_instances": entry["total_instances"],
+                }
+            ),
+            200,
+        )
 
+    # If a saved record exists, load and return results
+    data = load_result_record(image_id, index)
+    if data is not None:
+        try:
             original_mask_path = data["original_mask_path"]
             custom_mask_path = data["custom_mask_path"]
             total_instances = data["total_instances"]
@@ -272,6 +543,12 @@ def get_results(image_id: str, index: int):
                     {
                         "original_mask": original_mask_b64,
                         "custom_mask": custom_mask_b64,
+                        "original_mask_url": (
+                            mask_url(original_mask_path) if original_mask_path else None
+                        ),
+                        "custom_mask_url": (
+                            mask_url(custom_mask_path) if custom_mask_path else None
+                        ),
                         "metrics": {
                             "original_edge_alignment_score": data["metrics"].get(
                                 "original_edge_alignment_score", 0.0
@@ -285,6 +562,8 @@ def get_results(image_id: str, index: int):
                             "custom_region_homogeneity_score": data["metrics"].get(
                                 "custom_region_homogeneity_score", 0.0
                             ),
+                            "mask_iou": data["metrics"].get("mask_iou", 0.0),
+                            "mask_dice": data["metrics"].get("mask_dice", 0.0),
                             "processing_time": data["metrics"].get(
                                 "processing_time", 0.0
                             ),
@@ -297,16 +576,27 @@ def get_results(image_id: str, index: int):
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
-    # If metrics file doesn't exist, compute results on-demand
-    if not os.path.exists(image_path):
+    # If no saved record exists, compute results on-demand
+    if entry is None and not os.path.exists(image_path):
         return jsonify({"error": "Image not found"}), 404
 
     try:
-        start_time = time.time()
-        # Run Mask R-CNN for the specified index
-        original_mask, total_instances = run_mask_rcnn(image_path, index)
-
-        if original_mask is None:
+        if entry is not None:
+            # Reuse the cached decode, detector output, and edge map
+            image_np = entry["image"]
+            masks = entry["masks"]
+            total_instances = entry["total_instances"]
+            edge_map = entry["edge_map"]
+        else:
+            # Decode once and share the array across the pipeline
+            image_np = decode_image(image_path)
+
+            # Run Mask R-CNN once for all instances
+            masks, total_instances = run_mask_rcnn_all(image_np)
+            edge_map = compute_edge_map(image_np)
+            cache_image(image_id, image_np, masks, total_instances, edge_map)
+
+        if index < 0 or index >= total_instances:
             return (
                 jsonify(
                     {
@@ -317,73 +607,20 @@ def get_results(image_id: str, index: int):
                 404,
             )
 
-        # Run A* refinement
-        custom_mask = refine_mask(original_mask, image_path)
-
-        # Load image for metrics
-        image = Image.open(image_path).convert("RGB")
-        image_np = np.array(image)[:, :, ::-1]  # Convert RGB to BGR for OpenCV
+        original_mask = masks[index]
 
-        # Compute metrics for both masks in parallel
-        result_list = [None, None]  # [original_metrics, custom_metrics]
-        threads = [
-            threading.Thread(
-                target=compute_metrics_thread,
-                args=(original_mask, image_np, result_list, 0),
-            ),
-            threading.Thread(
-                target=compute_metrics_thread,
-                args=(custom_mask, image_np, result_list, 1),
-            ),
-        ]
-
-        # Start and join threads
-        for t in threads:
-            t.start()
-        for t in threads:
-            t.join()
-
-        original_metrics = result_list[0]
-        custom_metrics = result_list[1]
-
-        metrics = {
-            "original_edge_alignment_score": original_metrics["edge_alignment_score"],
-            "original_region_homogeneity_score": original_metrics[
-                "region_homogeneity_score"
-            ],
-            "custom_edge_alignment_score": custom_metrics["edge_alignment_score"],
-            "custom_region_homogeneity_score": custom_metrics[
-                "region_homogeneity_score"
-            ],
-            "processing_time": time.time() - start_time,
-        }
-
-        # Save results
-        original_mask_path = os.path.join(
-            RESULT_FOLDER, f"{image_id}_{index}_original.png"
+        result = refine_and_save(
+            original_mask, image_np, image_id, index, total_instances, edge_map
         )
-        custom_mask_path = os.path.join(RESULT_FOLDER, f"{image_id}_{index}_custom.png")
-        metrics_path = os.path.join(RESULT_FOLDER, f"{image_id}_{index}_metrics.json")
-
-        with file_lock:
-            Image.fromarray(original_mask).save(original_mask_path)
-            Image.fromarray(custom_mask).save(custom_mask_path)
-            with open(metrics_path, "w") as f:
-                json.dump(
-                    {
-                        "metrics": metrics,
-                        "original_mask_path": original_mask_path,
-                        "custom_mask_path": custom_mask_path,
-                        "total_instances": total_instances,
-                    },
-                    f,
-                )
 
-        # Prepare response
+        # Prepare response straight from the in-memory arrays; no need to
+        # re-read and re-decode the PNGs that were just written
         results = {
-            "original_mask": image_to_base64(original_mask_path),
-            "custom_mask": image_to_base64(custom_mask_path),
-            "metrics": metrics,
+            "original_mask": mask_to_base64(original_mask),
+            "custom_mask": mask_to_base64(result["custom_mask"]),
+            "original_mask_url": mask_url(result["original_mask_path"]),
+            "custom_mask_url": mask_url(result["custom_mask_path"]),
+            "metrics": result["metrics"],
             "total_instances": total_instances,
         }
 
@@ -393,4 +630,6 @@ def get_results(image_id: str, index: int):
 
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    # Local development entrypoint only; deploy with
+    # `gunicorn -c gunicorn_config.py app:app` for real parallelism
+    app.run(host="0.0.0.0", port=5000)
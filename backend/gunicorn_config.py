@@ -0,0 +1,16 @@
+import os
+
+# Forked workers give true parallelism for the CPU-bound pipeline; a couple
+# of threads per worker keep I/O (uploads, mask downloads) overlapped.
+workers = min(4, os.cpu_count() or 1)
+threads = 2
+
+# Mask R-CNN can take a while on large images
+timeout = 120
+
+# No preload: each worker imports the app (and builds the Mask R-CNN
+# predictor) itself. Initializing torch — and CUDA in particular — in the
+# master and then forking breaks inference in the workers, and the
+# copy-on-write saving only ever applied to CPU tensors.
+
+bind = "0.0.0.0:5000"
@@ -1,13 +1,65 @@
-from PIL import Image
 import base64
-import io
+import mmap
+import os
 
+import cv2
+import numpy as np
 
-def save_image(file, path):
-    img = Image.open(file)
-    img.save(path)
+try:
+    from turbojpeg import TurboJPEG
+
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, OSError):
+    # PyTurboJPEG or libturbojpeg may be missing; decode everything with OpenCV
+    _turbo_jpeg = None
+
+
+def decode_image_bytes(data: bytes) -> np.ndarray:
+    """Decode encoded image bytes to a contiguous BGR uint8 array.
+
+    JPEG data goes through libjpeg-turbo's SIMD decoder when available,
+    which is 2-4x faster than libjpeg and returns BGR directly; PNGs and
+    the fallback path use cv2.imdecode.
+    """
+    if _turbo_jpeg is not None and data[:2] == b"\xff\xd8":  # JPEG magic bytes
+        return _turbo_jpeg.decode(data)
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def decode_image(path: str) -> np.ndarray:
+    """Decode an image from disk to a contiguous BGR uint8 array."""
+    if _turbo_jpeg is not None:
+        with open(path, "rb") as f:
+            data = f.read()
+        return decode_image_bytes(data)
+    return cv2.imread(path, cv2.IMREAD_COLOR)
+
+
+# Low compression is nearly free for binary masks, and the RLE strategy
+# is optimal for their long two-valued runs
+MASK_PNG_PARAMS = [
+    cv2.IMWRITE_PNG_COMPRESSION,
+    1,
+    cv2.IMWRITE_PNG_STRATEGY,
+    cv2.IMWRITE_PNG_STRATEGY_RLE,
+]
+
+
+def mask_to_base64(mask: np.ndarray) -> str:
+    """Encode a mask ndarray to a base64 PNG string without touching disk."""
+    _, buf = cv2.imencode(".png", mask, MASK_PNG_PARAMS)
+    return base64.b64encode(buf).decode("utf-8")
 
 
 def image_to_base64(path):
-    with open(path, "rb") as f:
-        return base64.b64encode(f.read()).decode("utf-8")
+    # Memory-map the file so b64encode reads straight from the page cache
+    # instead of copying the bytes into Python first
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        mm = mmap.mmap(fd, 0, prot=mmap.PROT_READ)
+        try:
+            return base64.b64encode(mm).decode("utf-8")
+        finally:
+            mm.close()
+    finally:
+        os.close(fd)